@@ -3,16 +3,22 @@
 Full Flask app (strict species match) — MongoDB Atlas version of the Pokétwo recommender.
 
 Behavior:
-- Species search is exact-match (case-insensitive), equivalent to SQL `WHERE species = ? COLLATE NOCASE`.
-- Other logic (recommendation algorithm, UI, debug route, robust parsing) unchanged.
+- Species search is exact-match (case-insensitive), equivalent to SQL `WHERE species = ? COLLATE NOCASE`,
+  done with a strength-2 collation so the compound indexes (`flask --app app ensure-indexes`) are used.
+  A trailing `*` (e.g. `Pika*`) matches by prefix instead, still through the index.
+- `shiny` is matched as a bool or 1/0 (parser.py stores 1/0); `flask --app app normalize-shiny` folds the
+  legacy string forms ("1", "true", ...) into booleans.
+- Recommendations use the newest MAX_HISTORY sales; past-sales rows are pre-formatted before rendering.
 """
 
 import os
-import re
-import math
-import statistics
-from flask import Flask, render_template_string, request, Response
+import functools
+from dataclasses import dataclass, fields
+import numpy as np
+from flask import Flask, request, Response
+from flask_caching import Cache
 from pymongo import MongoClient
+from pymongo.errors import OperationFailure
 from pymongo.server_api import ServerApi
 from bson import json_util
 
@@ -24,6 +30,9 @@ MIN_DEV_PERCENT = 0.03
 MAX_MULTIPLIER = 2.0
 MAX_TREND_PCT = 0.25
 RECENT_WINDOW = 20
+MAX_HISTORY = 2000                # newest sales used for a recommendation
+DISPLAY_LIMIT = 500               # rows in the past-sales list
+CACHE_TIMEOUT = 300               # seconds; sold-auction history changes slowly
 
 # ------------------------------
 # Flask + MongoDB setup
@@ -34,47 +43,121 @@ MONGO_URI = os.environ.get("MONGO_URI")
 if not MONGO_URI:
     raise RuntimeError("MONGO_URI environment variable not set! Add it in Render/Env vars.")
 
-client = MongoClient(MONGO_URI, server_api=ServerApi("1"))
+# One pooled client per Gunicorn worker (created on import, after fork), reused by every request.
+client = MongoClient(
+    MONGO_URI,
+    server_api=ServerApi("1"),
+    appname="pokeprice",
+    maxPoolSize=50,
+    minPoolSize=5,
+    maxIdleTimeMS=300000,
+    socketTimeoutMS=45000,
+    serverSelectionTimeoutMS=5000,
+    retryReads=True,
+    compressors="zstd,zlib",
+    # searches tolerate slightly stale data (results are cached for minutes anyway),
+    # so spread them over the replica set; writes still go to the primary
+    readPreference="secondaryPreferred",
+    readConcernLevel="local",
+)
 db = client["auctions"]           # DB name you imported into
 auctions_col = db["auctions"]     # Collection name you used
 
+# Redis when REDIS_URL is set (shared by all workers), otherwise a per-process cache
+REDIS_URL = os.environ.get("REDIS_URL")
+cache = Cache(app, config={
+    "CACHE_TYPE": "RedisCache" if REDIS_URL else "SimpleCache",
+    "CACHE_REDIS_URL": REDIS_URL,
+    "CACHE_DEFAULT_TIMEOUT": CACHE_TIMEOUT,
+})
+
+# winning_bid -> int64 the way int(float(b)) did it; anything non-numeric becomes null
+BID_AS_LONG = {
+    "$convert": {
+        "input": {"$convert": {"input": "$winning_bid", "to": "double", "onError": None, "onNull": None}},
+        "to": "long",
+        "onError": None,
+        "onNull": None,
+    }
+}
+
+# Case-insensitive (strength 2) comparison. Queries must pass the same collation
+# as the indexes for Mongo to use them.
+SPECIES_COLLATION = {"locale": "en", "strength": 2}
+
+# Covers the recommendation pipeline when shiny is filtered: every field it filters, sorts or
+# projects on (for species/shiny-only searches) is in the index, so no documents are fetched.
+REC_INDEX = [("species", 1), ("shiny", 1), ("timestamp", 1), ("created_at", 1), ("winning_bid", 1)]
+
+# Compound indexes matching the filter + sort keys used by index().
+# (species, timestamp, created_at) serves "any shiny" searches: with shiny unconstrained,
+# REC_INDEX can't return the {timestamp, created_at} order without an in-memory sort.
+AUCTION_INDEXES = [
+    [("species", 1), ("shiny", 1), ("winning_bid", -1)],
+    [("species", 1), ("timestamp", 1), ("created_at", 1)],
+    REC_INDEX,
+    [("species", 1), ("iv_total", 1)],
+]
+
+# Run once per deploy, not at import: a worker or CLI call shouldn't wait on Mongo to start.
+@app.cli.command("ensure-indexes")
+def ensure_indexes():
+    """Create AUCTION_INDEXES (`flask --app app ensure-indexes`)."""
+    # create_index is a no-op when an identical index already exists
+    for keys in AUCTION_INDEXES:
+        print(f"index ready: {auctions_col.create_index(keys, collation=SPECIES_COLLATION, background=True)}")
+
+# Mongo's error code for a hint naming an index that doesn't exist (BadValue)
+BAD_HINT_CODE = 2
+
 # ------------------------------
-# Recommendation algorithm (unchanged)
+# Recommendation algorithm
 # ------------------------------
-def get_price_recommendation(chron_prices):
-    if not chron_prices:
-        return {"success": False, "message": "No past sales found for these criteria."}
-
-    # convert to ints, skip bad values
-    nums = []
-    for p in chron_prices:
-        try:
-            if p is None:
-                continue
-            nums.append(int(p))
-        except (ValueError, TypeError):
-            continue
+@functools.lru_cache(maxsize=256)
+def _ema_weights(m):
+    # w[i] = 2 ** (i / (m - 1)): the newest sale weighs twice the oldest.
+    # One pow + a running product instead of m exp() calls; shared, so read-only.
+    w = np.full(m, 2.0 ** (1.0 / max(1, m - 1)))
+    w[0] = 1.0
+    np.multiply.accumulate(w, out=w)
+    w.flags.writeable = False
+    return w
+
+def _quartiles(a):
+    # Q1/Q3 exactly as statistics.quantiles(a, n=4) (default "exclusive" method), but
+    # np.partition only places the four order statistics needed instead of sorting.
+    n = len(a)
+    js = [min(max(i * (n + 1) // 4, 1), n - 1) for i in (1, 3)]
+    part = np.partition(a, sorted({k for j in js for k in (j - 1, j)}))
+    out = []
+    for i, j in zip((1, 3), js):
+        delta = i * (n + 1) - j * 4
+        out.append((int(part[j - 1]) * (4 - delta) + int(part[j]) * delta) / 4)
+    return out
 
+def get_price_recommendation(chron_prices):
+    # chron_prices: int64 bids, oldest first (non-numeric ones are dropped by the pipeline)
+    nums = np.asarray(chron_prices, dtype=np.int64)
     n = len(nums)
+    if n == 0:
+        return {"success": False, "message": "No past sales found for these criteria."}
     if n < 2:
         return {"success": False, "message": "Not enough numeric sales for a reliable recommendation."}
 
-    cleaned_chron = nums[:]
+    cleaned_chron = nums
     if n >= 4:
-        try:
-            q1, _, q3 = statistics.quantiles(nums, n=4)
-            iqr = q3 - q1
-            lower = q1 - 1.5 * iqr
-            upper = q3 + 1.5 * iqr
-            potential_cleaned = [p for p in nums if (lower <= p <= upper)]
-            if len(potential_cleaned) >= 2:
-                cleaned_chron = potential_cleaned
-        except Exception:
-            cleaned_chron = nums[:]
-
+        q1, q3 = _quartiles(nums)
+        iqr = q3 - q1
+        lower = q1 - 1.5 * iqr
+        upper = q3 + 1.5 * iqr
+        potential_cleaned = nums[(nums >= lower) & (nums <= upper)]
+        if len(potential_cleaned) >= 2:
+            cleaned_chron = potential_cleaned
+
+    # n >= 2 and the IQR filter keeps >= 2, so ddof=1 is always defined
     m = len(cleaned_chron)
-    median = statistics.median(cleaned_chron)
-    stdev = statistics.stdev(cleaned_chron) if m > 1 else 0.0
+    median = float(np.median(cleaned_chron))
+    stdev = float(cleaned_chron.std(ddof=1))
 
     if median <= 0:
         base_dev = max(1.0, stdev, 5.0)
@@ -94,16 +177,16 @@ def get_price_recommendation(chron_prices):
 
     trend_info = {"slope": 0.0, "trend_pct": 0.0, "direction": "flat", "n": m}
     if m >= 6:
-        x = list(range(m))
-        y = cleaned_chron
-        alpha = math.log(2.0) / max(1, (m - 1))
-        weights = [math.exp(alpha * i) for i in x]
-        w_sum = sum(weights)
-        x_mean = sum(w * xi for w, xi in zip(weights, x)) / w_sum
-        y_mean = sum(w * yi for w, yi in zip(weights, y)) / w_sum
-        num = sum(w * (xi - x_mean) * (yi - y_mean) for w, xi, yi in zip(weights, x, y))
-        den = sum(w * (xi - x_mean) ** 2 for w, xi in zip(weights, x))
-        slope = (num / den) if den != 0 else 0.0
+        x = np.arange(m, dtype=np.float64)
+        y = cleaned_chron.astype(np.float64)
+        weights = _ema_weights(m)
+        w_sum = weights.sum()
+        x_mean = (weights * x).sum() / w_sum
+        y_mean = (weights * y).sum() / w_sum
+        dx = x - x_mean
+        num = (weights * dx * (y - y_mean)).sum()
+        den = (weights * dx * dx).sum()
+        slope = float(num / den) if den != 0 else 0.0
         recent_window = min(RECENT_WINDOW, m)
         trend_pct = (slope * recent_window) / median if median else 0.0
         trend_pct = max(-MAX_TREND_PCT, min(MAX_TREND_PCT, trend_pct))
@@ -132,7 +215,7 @@ def get_price_recommendation(chron_prices):
     }
 
 # ------------------------------
-# HTML template (unchanged)
+# HTML template
 # ------------------------------
 HTML_TEMPLATE = """<!DOCTYPE html>
 <html lang="en">
@@ -212,12 +295,12 @@ HTML_TEMPLATE = """<!DOCTYPE html>
               <li class="auction-item">
                 <div>
                   {% if a.shiny %}✨{% endif %} <strong>{{ a.species }}</strong>
-                  (Lvl {{ a.level or '?' }}, {{ '%.1f'|format(a.iv_total|float) if a.iv_total else '?' }}% IV)
+                  (Lvl {{ a.level or '?' }}, {{ a._iv_total_fmt }}% IV)
                   <small style="color: #555; display: block;">
-                    IVs: {{a.iv_hp or '?'}}/{{a.iv_atk or '?'}}/{{a.iv_def or '?'}}/{{a.iv_spatk or '?'}}/{{a.iv_spdef or '?'}}/{{a.iv_speed or '?'}}
+                    IVs: {{ a._ivs }}
                   </small>
                 </div>
-                <div><strong>{{ "{:,.0f}".format(a.winning_bid) if a.winning_bid else '—' }}</strong></div>
+                <div><strong>{{ a._wb_fmt }}</strong></div>
               </li>
             {% endfor %}
           </ul>
@@ -229,93 +312,190 @@ HTML_TEMPLATE = """<!DOCTYPE html>
 </html>
 """
 
+# Compiled once at import; app.jinja_env keeps autoescaping on for string templates.
+_TEMPLATE = app.jinja_env.from_string(HTML_TEMPLATE)
+
 # ------------------------------
 # Routes
 # ------------------------------
-@app.route("/", methods=["GET", "POST"])
-def index():
-    auctions_display = []
-    recommendation = {}
+IV_NAMES = ('iv_hp', 'iv_atk', 'iv_def', 'iv_spatk', 'iv_spdef', 'iv_speed')
+
+# only the fields the results list renders
+DISPLAY_PROJECTION = {"_id": 0, "shiny": 1, "species": 1, "level": 1, "iv_total": 1, "winning_bid": 1,
+                      **{iv: 1 for iv in IV_NAMES}}
+
+# form value -> Mongo predicate for the two select boxes; "any" is absent and adds no filter
+# shiny: bools, or the INTEGER 1/0 parser.py writes -- two index point intervals either way
+SHINY_QUERY = {"yes": {"$in": [True, 1]}, "no": {"$in": [False, 0]}}
+GENDER_QUERY = {"Male": "Male", "Female": "Female"}
+
+@dataclass(frozen=True, slots=True)
+class SearchForm:
+    """The submitted search form; the template reads its attributes as form_data.*."""
+    species: str = ""
+    shiny: str = "any"
+    gender: str = "any"
+    min_iv_total: str = ""
+    iv_hp: str = ""
+    iv_atk: str = ""
+    iv_def: str = ""
+    iv_spatk: str = ""
+    iv_spdef: str = ""
+    iv_speed: str = ""
+
+    @classmethod
+    def from_form(cls, form):
+        values = {k: v for k, v in form.to_dict().items() if k in SEARCH_FIELDS}
+        if "species" in values:
+            values["species"] = values["species"].strip()
+        return cls(**values)
+
+    def filter_key(self):
+        """Hashable, normalized filter tuple: (species_lower, shiny, gender, min_iv_total, *ivs)."""
+        return (
+            self.species.lower(),
+            self.shiny,
+            self.gender,
+            self.min_iv_total.strip(),
+            self.iv_hp.strip(),
+            self.iv_atk.strip(),
+            self.iv_def.strip(),
+            self.iv_spatk.strip(),
+            self.iv_spdef.strip(),
+            self.iv_speed.strip(),
+        )
 
-    iv_names = ['iv_hp', 'iv_atk', 'iv_def', 'iv_spatk', 'iv_spdef', 'iv_speed']
-    form_data = {
-        "species": request.form.get("species", "").strip(),
-        "shiny": request.form.get("shiny", "any"),
-        "gender": request.form.get("gender", "any"),
-        "min_iv_total": request.form.get("min_iv_total", "")
-    }
-    for iv in iv_names:
-        form_data[iv] = request.form.get(iv, "")
-
-    if request.method == "POST" and form_data["species"]:
-        # --- STRICT species exact-match (case-insensitive) ---
-        # Equivalent of SQL: WHERE species = ? COLLATE NOCASE
-        safe_species = re.escape(form_data['species'])
-        query = {"species": {"$regex": f"^{safe_species}$", "$options": "i"}}
-
-        # shiny: handle 1/0, booleans and common string forms
-        if form_data["shiny"] == "yes":
-            query["shiny"] = {"$in": [1, True, "1", "true", "True"]}
-        elif form_data["shiny"] == "no":
-            query["shiny"] = {"$in": [0, False, "0", "false", "False"]}
-
-        # gender: case-insensitive exact
-        if form_data["gender"] in ("Male", "Female"):
-            query["gender"] = {"$regex": f"^{re.escape(form_data['gender'])}$", "$options": "i"}
-
-        # min iv total
-        min_iv_total_str = form_data.get("min_iv_total", "").strip()
-        if min_iv_total_str:
+SEARCH_FIELDS = frozenset(f.name for f in fields(SearchForm))
+
+def _as_float(value):
+    """float(value), or 0.0 if it isn't numeric -- what Jinja's |float filter did in the template."""
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return 0.0
+
+@cache.memoize(timeout=CACHE_TIMEOUT)
+def _search(filter_key):
+    """Run both Mongo queries and the stats for one filter tuple; returns (auctions_display, recommendation)."""
+    species, shiny, gender, min_iv_total_str = filter_key[:4]
+    iv_vals = filter_key[4:]
+
+    # --- STRICT species exact-match (case-insensitive) ---
+    # Equivalent of SQL: WHERE species = ? COLLATE NOCASE
+    # Plain equality under SPECIES_COLLATION, so the indexes below bound the scan.
+    # A trailing '*' asks for a prefix match instead; it is expressed as a collated range
+    # (U+FFFF sorts after every character in ICU) so it stays an index range scan too.
+    prefix = species.rstrip("*")
+    if prefix and prefix != species:
+        query = {"species": {"$gte": prefix, "$lt": prefix + "\uffff"}}
+    else:
+        query = {"species": species}
+
+    # shiny: bool or 1/0 (see SHINY_QUERY)
+    if shiny in SHINY_QUERY:
+        query["shiny"] = SHINY_QUERY[shiny]
+
+    # gender: case-insensitive exact (equality under SPECIES_COLLATION)
+    if gender in GENDER_QUERY:
+        query["gender"] = GENDER_QUERY[gender]
+
+    # min iv total
+    if min_iv_total_str:
+        try:
+            min_iv_val = float(min_iv_total_str)
+            query["iv_total"] = {"$gte": min_iv_val}
+        except ValueError:
+            pass
+
+    # individual IVs
+    for iv, iv_val_str in zip(IV_NAMES, iv_vals):
+        if iv_val_str:
             try:
-                min_iv_val = float(min_iv_total_str)
-                query["iv_total"] = {"$gte": min_iv_val}
+                iv_val = int(iv_val_str)
+                if 0 <= iv_val <= 31:
+                    query[iv] = {"$gte": iv_val}
             except ValueError:
                 pass
 
-        # individual IVs
-        for iv in iv_names:
-            iv_val_str = form_data.get(iv, "").strip()
-            if iv_val_str:
-                try:
-                    iv_val = int(iv_val_str)
-                    if 0 <= iv_val <= 31:
-                        query[iv] = {"$gte": iv_val}
-                except ValueError:
-                    pass
-
-        # Recommendation & display queries should only use docs that have a winning_bid
-        rec_query = dict(query)
-        rec_query["winning_bid"] = {"$ne": None}
-
-        # Chronological for recommendation (oldest -> newest).
-        # Some docs have empty "timestamp" but have "created_at", so sort by both.
-        rec_auctions = list(
-            auctions_col.find(rec_query, {"winning_bid": 1, "timestamp": 1, "created_at": 1, "_id": 0})
-                        .sort([("timestamp", 1), ("created_at", 1)])
-        )
+    # Recommendation & display queries should only use docs that have a winning_bid
+    rec_query = dict(query)
+    rec_query["winning_bid"] = {"$ne": None}
+
+    # Most recent MAX_HISTORY sales (newest first), folded server-side into a single
+    # document holding the ordered array of numeric bids; reversed below to oldest -> newest.
+    # Some docs have empty "timestamp" but have "created_at", so sort by both.
+    rec_pipeline = [
+        {"$match": rec_query},
+        {"$sort": {"timestamp": -1, "created_at": -1}},
+        {"$limit": MAX_HISTORY},
+        {"$project": {"_id": 0, "b": BID_AS_LONG}},
+        {"$match": {"b": {"$ne": None}}},
+        {"$group": {"_id": None, "bids": {"$push": "$b"}}},
+    ]
+
+    # Display: sorted by winning_bid desc
+    display_pipeline = [
+        {"$match": rec_query},
+        {"$sort": {"winning_bid": -1}},
+        {"$limit": DISPLAY_LIMIT},
+        {"$project": DISPLAY_PROJECTION},
+    ]
+    # batchSize = the $limit: the whole list arrives in the first reply, no getMore round-trip
+    auctions_display = list(auctions_col.aggregate(display_pipeline, allowDiskUse=True,
+                                                    collation=SPECIES_COLLATION,
+                                                    batchSize=DISPLAY_LIMIT))
+
+    # pre-format the per-row strings once here (and into the cache) instead of per render
+    for a in auctions_display:
+        a["_iv_total_fmt"] = "%.1f" % _as_float(a["iv_total"]) if a.get("iv_total") else "?"
+        a["_ivs"] = "/".join(str(a.get(iv) or "?") for iv in IV_NAMES)
+        a["_wb_fmt"] = "{:,.0f}".format(a["winning_bid"]) if a.get("winning_bid") else "—"
+
+    # REC_INDEX only yields the sort order once shiny is an equality; without it, leave the
+    # choice (normally the (species, timestamp, created_at) index) to the planner
+    rec_opts = {"allowDiskUse": True, "collation": SPECIES_COLLATION}
+    if "shiny" in rec_query:
+        try:
+            rec_cursor = auctions_col.aggregate(rec_pipeline, hint=REC_INDEX, **rec_opts)
+        except OperationFailure as e:
+            if e.code != BAD_HINT_CODE:
+                raise
+            # REC_INDEX isn't there (ensure-indexes not run yet): let the planner pick instead
+            app.logger.warning("REC_INDEX hint rejected, running unhinted: %s", e)
+            rec_cursor = auctions_col.aggregate(rec_pipeline, **rec_opts)
+    else:
+        rec_cursor = auctions_col.aggregate(rec_pipeline, **rec_opts)
+    rec_doc = next(rec_cursor, None)
+    bids = rec_doc["bids"] if rec_doc else []
+    chron_bids = np.fromiter(bids, dtype=np.int64, count=len(bids))[::-1]
 
-        # Display: sorted by winning_bid desc
-        auctions_display = list(
-            auctions_col.find(rec_query, {"_id": 0})
-                        .sort("winning_bid", -1)
-                        .limit(500)
-        )
+    return auctions_display, get_price_recommendation(chron_bids)
 
-        # Robust parse winning_bid into ints (skip non-numeric)
-        chron_bids = []
-        for a in rec_auctions:
-            b = a.get("winning_bid")
-            try:
-                chron_bids.append(int(float(b)))
-            except (TypeError, ValueError):
-                continue
+@app.route("/", methods=["GET", "POST"])
+def index():
+    auctions_display = []
+    recommendation = {}
+
+    form_data = SearchForm.from_form(request.form)
+
+    if request.method == "POST" and form_data.species:
+        auctions_display, recommendation = _search(form_data.filter_key())
+
+    return _TEMPLATE.render(form_data=form_data,
+                            auctions_display=auctions_display,
+                            recommendation=recommendation,
+                            request=request)
 
-        recommendation = get_price_recommendation(chron_bids)
+# One-time migration: `flask --app app normalize-shiny`
+SHINY_TRUE_FORMS = [1, "1", "true", "True"]
+SHINY_FALSE_FORMS = [0, "0", "false", "False"]
 
-    return render_template_string(HTML_TEMPLATE,
-                                  form_data=form_data,
-                                  auctions_display=auctions_display,
-                                  recommendation=recommendation)
+@app.cli.command("normalize-shiny")
+def normalize_shiny():
+    """Rewrite the 1/0 and string forms of `shiny` as real booleans (searches match bools and 1/0)."""
+    yes = auctions_col.update_many({"shiny": {"$in": SHINY_TRUE_FORMS}}, {"$set": {"shiny": True}})
+    no = auctions_col.update_many({"shiny": {"$in": SHINY_FALSE_FORMS}}, {"$set": {"shiny": False}})
+    print(f"shiny normalized: {yes.modified_count} -> true, {no.modified_count} -> false")
 
 # Debug endpoint to inspect collection quickly on deployed app
 @app.route("/_debug/sample")
@@ -8,23 +8,33 @@ Extracts sub-IVs (hp/atk/def/spatk/spdef/speed) and total IV.
 """
 
 import argparse
+import itertools
 import json
 import re
 import sqlite3
 import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Iterator, Dict, Any, Optional
+from typing import Iterable, Iterator, Dict, Any, List, Optional, Tuple, Union
 
 # progress bar
 from tqdm import tqdm
 
+# optional: orjson decodes/encodes several times faster; stdlib json is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# optional: ijson (yajl2_c backend) as an alternative, strict streaming reader
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
 # --- Logging ---
-logging.basicConfig(
-    level=logging.WARNING,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    filename="parser_errors.log",
-    filemode="w"
-)
+# handlers are configured in main(), so importing the module (tests, app) leaves parser_errors.log alone
 logger = logging.getLogger(__name__)
 
 # --- DB schema & SQL ---
@@ -52,99 +62,345 @@ CREATE TABLE IF NOT EXISTS auctions (
     raw TEXT,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
+"""
+
+# dropped before and rebuilt after the bulk load so inserts don't pay for per-row index updates
+# idx_auctions_recommend matches recommend_fixed.py's query: case-insensitive species + shiny equality,
+# rows already ordered by winning_bid, then every other column the bid lookup reads so that lookup
+# never touches the table
+AUCTIONS_INDEXES = """
 CREATE INDEX IF NOT EXISTS idx_auctions_species_shiny ON auctions (species, shiny);
+CREATE INDEX IF NOT EXISTS idx_auctions_recommend
+    ON auctions (species COLLATE NOCASE, shiny, winning_bid, gender, nature, iv_total, level)
+    WHERE winning_bid IS NOT NULL AND winning_bid > 0;
+ANALYZE;
+"""
+# run one by one inside the load transaction (executescript would COMMIT first)
+DROP_INDEXES = (
+    "DROP INDEX IF EXISTS idx_auctions_species_shiny",
+    "DROP INDEX IF EXISTS idx_auctions_recommend",
+)
+
+BULK_LOAD_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-65536;
+PRAGMA mmap_size=268435456;
+"""
+
+# --fast, for throwaway DBs: no fsyncs and an in-memory rollback journal
+# (not OFF: the per-batch savepoints still need to roll back). A crash mid-load can corrupt the file.
+FAST_LOAD_PRAGMAS = """
+PRAGMA journal_mode=MEMORY;
+PRAGMA synchronous=OFF;
+PRAGMA temp_store=MEMORY;
+PRAGMA locking_mode=EXCLUSIVE;
+PRAGMA cache_size=-65536;
 """
 
-INSERT_SQL = """
-INSERT OR REPLACE INTO auctions (
+# SOLD auctions don't change once sold, so re-runs skip known auction_ids; --replace overwrites them
+_INSERT_SQL = """
+INSERT OR {action} INTO auctions (
     auction_id, species, level, shiny, gender, nature,
     iv_hp, iv_atk, iv_def, iv_spatk, iv_spdef, iv_speed, iv_total,
     winning_bid, winner_id, seller, timestamp, title, raw
 ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
 """
+INSERT_SQL = _INSERT_SQL.format(action="IGNORE")
+REPLACE_SQL = _INSERT_SQL.format(action="REPLACE")
 
 # ---------------- streaming JSON reader ----------------
-def stream_messages_from_file(filepath: Path) -> Iterator[Dict[str, Any]]:
+READ_CHUNK_SIZE = 4 * 1024 * 1024
+MESSAGES_START_RE = re.compile(rb'"messages"\s*:\s*\[')
+BRACE_RE = re.compile(rb'[{}]')
+IN_STRING_RE = re.compile(rb'["\\]')   # bytes that end or escape inside a JSON string
+BACKSLASH = 0x5c
+OPEN_BRACE = 0x7b
+# Cheap pre-check before decoding: a message can only hold a SOLD embed if its raw bytes contain
+# "[sold]" in any case (b"\xc5\xbf" is 'ſ', which upper()s to 'S') or a \u escape that could spell it.
+SOLD_HINT_RE = re.compile(rb'(?i)\[(?:s|\xc5\xbf)old\]|\\u')
+
+if orjson is not None:
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode("utf-8")  # UTF-8, never ASCII-escaped
+else:
+    _json_loads = json.loads
+
+    def _json_dumps(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False)
+
+def _decode_object(obj: Union[bytes, memoryview]) -> Optional[Dict[str, Any]]:
+    try:
+        return _json_loads(obj)
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        pass
+    obj = bytes(obj)
+    try:
+        # same leniency as reading the file with errors="ignore"
+        return _json_loads(obj.decode("utf-8", errors="ignore"))
+    except json.JSONDecodeError:  # orjson.JSONDecodeError subclasses it
+        logger.warning("Skipping malformed JSON object fragment: %s",
+                       obj[:200].decode("utf-8", errors="replace").replace("\n", " "))
+        return None
+
+def stream_messages_from_file(filepath: Path, sold_only: bool = False, decode: bool = True) -> Iterator[Any]:
     """
     Memory-safe generator reading chat.json and yielding each message object found inside top-level "messages" array.
     Tolerant to small JSON irregularities (skips malformed objects).
-    """
-    with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-        obj_buffer = ""
-        brace_level = 0
-        in_messages_array = False
-        found_start = False
 
+    Works on a rolling bytes buffer and jumps from brace to brace with C-level searches
+    (regex/find/count) instead of walking every character in Python; quote parity between
+    braces tells whether a brace sits inside a string (message content), which is ignored.
+    With sold_only=True, messages that cannot contain a [SOLD] embed are skipped undecoded.
+    With decode=False the raw bytes of each message object are yielded instead of dicts.
+    """
+    with open(filepath, "rb") as f:
+        buf = bytearray()
+        # find the opening '[' of the messages array (keep a tail in case the key straddles reads)
         while True:
-            chunk = f.read(128 * 1024)
+            chunk = f.read(READ_CHUNK_SIZE)
             if not chunk:
+                return
+            buf += chunk
+            m = MESSAGES_START_RE.search(buf)
+            if m:
+                pos = m.end()
                 break
-            for ch in chunk:
-                if not in_messages_array:
-                    temp = (obj_buffer[-20:] if len(obj_buffer) > 20 else obj_buffer) + ch
-                    if '"messages": [' in temp and not found_start:
-                        in_messages_array = True
-                        found_start = True
-                        obj_buffer = ""
+            del buf[:-64]
+
+        depth = 0          # brace depth; 1 == inside a message object
+        in_string = False
+        start = 0          # offset of the current message's '{'
+        # orjson parses straight from a memoryview slice, saving a copy per message; the view is
+        # released before every resize of buf (a bytearray can't be resized while exported)
+        view = memoryview(buf)
+        while True:
+            if in_string:
+                m = IN_STRING_RE.search(buf, pos)
+                if m is None or (buf[m.start()] == BACKSLASH and m.end() == len(buf)):
+                    scanned = len(buf) if m is None else m.start()
+                else:
+                    pos = m.end()
+                    if buf[m.start()] == BACKSLASH:
+                        pos += 1  # skip the escaped byte (covers \" and \\)
                     else:
-                        obj_buffer = temp
+                        in_string = False
                     continue
+            else:
+                m = BRACE_RE.search(buf, pos)
+                if m is not None:
+                    brace = m.start()
+                    # Quotes between here and the brace decide whether it is inside a string.
+                    # Without escaped quotes their parity says so directly; otherwise step into
+                    # the first string and let the in-string branch walk the escapes.
+                    if buf.find(b'"', pos, brace) != -1:
+                        if buf.find(b'\\"', pos, brace) != -1:
+                            pos = buf.find(b'"', pos, brace) + 1
+                            in_string = True
+                            continue
+                        if buf.count(b'"', pos, brace) % 2:
+                            pos = brace + 1
+                            in_string = True
+                            continue
+                    pos = brace + 1
+                    if buf[brace] == OPEN_BRACE:
+                        if depth == 0:
+                            start = brace
+                        depth += 1
+                    elif depth > 0:
+                        depth -= 1
+                        if depth == 0:
+                            if sold_only and SOLD_HINT_RE.search(buf, start, pos) is None:
+                                continue
+                            if not decode:
+                                yield bytes(buf[start:pos])
+                                continue
+                            message = _decode_object(view[start:pos] if orjson is not None
+                                                     else bytes(buf[start:pos]))
+                            if message is not None:
+                                yield message
+                    continue
+                scanned = pos  # rescan the tail: it may hold the start of a string
+
+            # need more data; drop what is no longer needed (everything, between messages)
+            keep_from = start if depth else scanned
+            view.release()
+            del buf[:keep_from]
+            pos = scanned - keep_from
+            start = 0
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                return
+            buf += chunk
+            view = memoryview(buf)
 
-                if ch == "{":
-                    if brace_level == 0:
-                        obj_buffer = ch
-                    else:
-                        obj_buffer += ch
-                    brace_level += 1
-                elif ch == "}":
-                    if brace_level > 0:
-                        brace_level -= 1
-                        obj_buffer += ch
-                        if brace_level == 0 and obj_buffer:
-                            try:
-                                yield json.loads(obj_buffer)
-                            except json.JSONDecodeError:
-                                logger.warning("Skipping malformed JSON object fragment: %s", obj_buffer[:200].replace("\n"," "))
-                            obj_buffer = ""
-                elif brace_level > 0:
-                    obj_buffer += ch
+def stream_messages_ijson(filepath: Path) -> Iterator[Dict[str, Any]]:
+    """
+    Same contract as stream_messages_from_file, but tokenizing is done by ijson's C backend.
+    Strict: a malformed object ends the stream (logged) instead of being skipped.
+    """
+    with open(filepath, "rb") as f:
+        try:
+            yield from ijson.items(f, "messages.item", use_float=True)
+        except ijson.common.JSONError as e:
+            logger.warning("ijson stopped at malformed JSON: %s", e)
 
 # ---------------- helpers & regexes ----------------
+NON_DIGIT_RE = re.compile(r"[^0-9]")
+CLEAN_MARKUP_RE = re.compile(r"[*_`~]")
+
 def clean_number(text: str) -> Optional[int]:
     if not text:
         return None
-    s = re.sub(r"[^0-9]", "", str(text))
+    s = NON_DIGIT_RE.sub("", str(text))
     return int(s) if s else None
 
 AUCTION_TITLE_RE = re.compile(r"Auction\s*#\s*(\d+)", re.IGNORECASE)
 LEVEL_RE = re.compile(r"Level\s*[:\s]*?(\d{1,3})", re.IGNORECASE)
 SHINY_RE = re.compile(r"✨|\bshiny\b", re.IGNORECASE)
-TOTAL_IV_RE = re.compile(r"Total\s*IV[:\*\s]*([0-9]+(?:\.[0-9]+)?)\s*%?", re.IGNORECASE)
-WINNING_BID_RE = re.compile(r"Winning\s*Bid[^0-9\n\r]*([0-9][0-9,]*)", re.IGNORECASE)
+WINNING_BID_RE = re.compile(r"Winning\s*Bid[^0-9\n\r]{0,80}([0-9][0-9,]*)", re.IGNORECASE)
 WINNER_RE = re.compile(r"Winner[:`\s]*<@!?(\d+)>", re.IGNORECASE)
+WINNER_NAME_RE = re.compile(r"(?:Winner|Bidder)[:\s]*@?([^\n\r,]+)", re.IGNORECASE)
+POKECOINS_RE = re.compile(r"([0-9,]+)\s*Pok[eé]coins", re.IGNORECASE)
+LEVEL_STRIP_RE = re.compile(r"Level\s*\d+", re.IGNORECASE)
+TITLE_TAIL_SPLIT_RE = re.compile(r"[-:]")
+
+# Pokémon details: one finditer pass picks up every sub-IV line ("<Stat> ... IV: nn/31"), the total
+# IV, gender and nature; m.lastgroup says which. The sub-IV gap is bounded so a stat name without a
+# following IV costs at most 80 characters of backtracking.
+DETAILS_RE = re.compile(
+    r"\b(?P<stat>HP|Attack|Defense|Sp\.?\s*Atk|Sp\.?\s*Def|Speed)\b[^\n]{0,80}?IV[:\s]*(?P<iv>[0-9]{1,2})/31"
+    r"|Total\s*IV[:\*\s]*(?P<total>[0-9]+(?:\.[0-9]+)?)"
+    r"|Gender[:\s]*(?P<gender>[MFmf♂♀\w]+)"
+    r"|Nature[:\s]*(?P<nature>[A-Za-z\-]+)",
+    re.IGNORECASE)
+SUBIV_KEYS = {
+    "hp": "iv_hp",
+    "attack": "iv_atk",
+    "defense": "iv_def",
+    "spatk": "iv_spatk",
+    "spdef": "iv_spdef",
+    "speed": "iv_speed",
+}
 
-# sub-IV patterns tolerant to formatting differences
-SUBIV_PATTERNS = {
-    "iv_hp": re.compile(r"HP[:\s]*.*?IV[:\s]*([0-9]{1,2})/31", re.IGNORECASE | re.DOTALL),
-    "iv_atk": re.compile(r"Attack[:\s]*.*?IV[:\s]*([0-9]{1,2})/31", re.IGNORECASE | re.DOTALL),
-    "iv_def": re.compile(r"Defense[:\s]*.*?IV[:\s]*([0-9]{1,2})/31", re.IGNORECASE | re.DOTALL),
-    "iv_spatk": re.compile(r"Sp\.?\s*Atk[:\s]*.*?IV[:\s]*([0-9]{1,2})/31", re.IGNORECASE | re.DOTALL),
-    "iv_spdef": re.compile(r"Sp\.?\s*Def[:\s]*.*?IV[:\s]*([0-9]{1,2})/31", re.IGNORECASE | re.DOTALL),
-    "iv_speed": re.compile(r"Speed[:\s]*.*?IV[:\s]*([0-9]{1,2})/31", re.IGNORECASE | re.DOTALL),
+# Fast path for the usual one-item-per-line layout ("HP: 47 – IV: 6/31", "Total IV: 27.26%", ...):
+# split the line at its first ':' and look the label up. Anything it doesn't recognise exactly
+# sends the whole field back to DETAILS_RE, so odd layouts parse as before.
+DETAIL_LINE_KEYS = {
+    "HP": "iv_hp",
+    "Attack": "iv_atk",
+    "Defense": "iv_def",
+    "Sp. Atk": "iv_spatk",
+    "Sp. Def": "iv_spdef",
+    "Speed": "iv_speed",
+    "Total IV": "total",
+    "Gender": "gender",
+    "Nature": "nature",
 }
+GENDER_SYMBOLS = ("♂", "♀")
+
+def _details_by_line(fval: str) -> Optional[List[Tuple[str, Any]]]:
+    """(kind, value) per line of a cleaned details field, or None if any line needs the regex."""
+    items = []
+    for line in fval.splitlines():
+        if not line:
+            continue
+        label, _, value = line.partition(":")
+        kind = DETAIL_LINE_KEYS.get(label)
+        if kind is None:
+            return None
+        value = value.strip()
+        if not value:
+            return None
+        if kind == "total":
+            number = value[:-1] if value.endswith("%") else value
+            whole, dot, frac = number.partition(".")
+            if not (whole.isascii() and whole.isdigit() and (not dot or (frac.isascii() and frac.isdigit()))):
+                return None
+            items.append((kind, float(number)))
+        elif kind == "nature":
+            if not (value.isascii() and value.replace("-", "").isalpha()):
+                return None
+            items.append((kind, value))
+        elif kind == "gender":
+            if not (value.isalnum() or value in GENDER_SYMBOLS):
+                return None
+            items.append((kind, value))
+        else:
+            stat_info, sep, iv = value.partition("IV:")
+            iv = iv.strip()
+            if (not sep or len(line) > 80 or "iv" in stat_info.casefold() or not iv.endswith("/31")
+                    or not 1 <= len(iv) - 3 <= 2 or not (iv[:-3].isascii() and iv[:-3].isdigit())):
+                return None
+            items.append((kind, int(iv[:-3])))
+    return items
+
+def _details_by_regex(fval: str) -> Iterator[Tuple[str, Any]]:
+    for m in DETAILS_RE.finditer(fval):
+        kind = m.lastgroup
+        if kind == "total":
+            yield kind, float(m.group("total"))
+        elif kind == "gender":
+            yield kind, m.group("gender").strip()
+        elif kind == "nature":
+            yield kind, m.group("nature").strip()
+        else:
+            yield SUBIV_KEYS["".join(m.group("stat").casefold().replace(".", "").split())], int(m.group("iv"))
 
 def clean_text(s: str) -> str:
     if not isinstance(s, str):
         return ""
     s = s.replace('\u200b', '')
-    s = re.sub(r"[*_`~]", "", s)
+    s = CLEAN_MARKUP_RE.sub("", s)
     return s.strip()
 
 # ---------------- extraction (only [SOLD]) ----------------
-def extract_auction_data(embed: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+def parse_title(title: str) -> Optional[Tuple[str, str, int, Optional[int]]]:
+    """
+    Title-only part of extract_auction_data: (auction_id, species, shiny, level), or None if
+    the title is not a usable [SOLD] auction.
+    """
+    # Only accept embeds whose title starts with [SOLD] (case-insensitive)
+    if not title.upper().strip().startswith("[SOLD]"):
+        return None
+
+    # Auction ID required
+    aid_m = AUCTION_TITLE_RE.search(title)
+    if not aid_m:
+        return None
+    auction_id = aid_m.group(1)
+
+    # species extraction: prefer '•' split like '[SOLD] ... • Species'
+    species = None
+    if "•" in title:
+        species_part = title.split("•")[-1]
+        species = LEVEL_STRIP_RE.sub("", species_part).strip()
+        species = species.replace("✨", "").strip()
+    else:
+        # fallback: last segment after '-' or ':'
+        species_part = TITLE_TAIL_SPLIT_RE.split(title)[-1].strip()
+        species = LEVEL_STRIP_RE.sub("", species_part).strip()
+        species = species.replace("✨", "").strip()
+
+    if not species:
+        return None
+
+    # shiny detection
+    shiny = 1 if SHINY_RE.search(title) else 0
+
+    # level if present
+    m_level = LEVEL_RE.search(title)
+    level = int(m_level.group(1)) if m_level else None
+
+    return auction_id, species, shiny, level
+
+def extract_auction_data(embed: Dict[str, Any]) -> Optional[Tuple[Any, ...]]:
     """
     Process embed only if title starts with [SOLD] (case-insensitive).
-    Returns dict ready for DB insertion (keys match INSERT_SQL order).
+    Returns a row tuple ready for DB insertion (values in INSERT_SQL column order).
     """
     try:
         if not isinstance(embed, dict):
@@ -153,39 +409,14 @@ def extract_auction_data(embed: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         if not isinstance(title, str):
             return None
 
-        # Only accept embeds whose title starts with [SOLD] (case-insensitive)
-        if not title.upper().strip().startswith("[SOLD]"):
+        parsed = parse_title(title)
+        if parsed is None:
             return None
-
-        # Auction ID required
-        aid_m = AUCTION_TITLE_RE.search(title)
-        if not aid_m:
-            return None
-        auction_id = aid_m.group(1)
-
-        # species extraction: prefer '•' split like '[SOLD] ... • Species'
-        species = None
-        if "•" in title:
-            species_part = title.split("•")[-1]
-            species = re.sub(r"Level\s*\d+", "", species_part, flags=re.IGNORECASE).strip()
-            species = species.replace("✨", "").strip()
-        else:
-            # fallback: last segment after '-' or ':'
-            species_part = re.split(r"[-:]", title)[-1].strip()
-            species = re.sub(r"Level\s*\d+", "", species_part, flags=re.IGNORECASE).strip()
-            species = species.replace("✨", "").strip()
-
-        if not species:
-            return None
-
-        # shiny detection
-        shiny = 1 if SHINY_RE.search(title) else 0
-
-        # level if present
-        level = int(LEVEL_RE.search(title).group(1)) if LEVEL_RE.search(title) else None
+        auction_id, species, shiny, level = parsed
 
         # initialize outputs
-        iv_hp = iv_atk = iv_def = iv_spatk = iv_spdef = iv_speed = iv_total = None
+        ivs: Dict[str, Optional[int]] = {}
+        iv_total = None
         winning_bid = None
         winner_id = None
         nature = None
@@ -199,39 +430,21 @@ def extract_auction_data(embed: Dict[str, Any]) -> Optional[Dict[str, Any]]:
 
             # Pokémon details - sub IVs and total IV, gender, nature
             if "pokemon" in fname or "pokémon" in fname or "details" in fname:
-                # total iv
-                m_tot = TOTAL_IV_RE.search(fval)
-                if m_tot:
-                    try:
-                        iv_total = float(m_tot.group(1))
-                    except Exception:
-                        iv_total = None
-
-                # sub IVs
-                for key, pat in SUBIV_PATTERNS.items():
-                    if m := pat.search(fval):
-                        try:
-                            val = int(m.group(1))
-                        except:
-                            val = None
-                        if key == "iv_hp":
-                            iv_hp = val
-                        elif key == "iv_atk":
-                            iv_atk = val
-                        elif key == "iv_def":
-                            iv_def = val
-                        elif key == "iv_spatk":
-                            iv_spatk = val
-                        elif key == "iv_spdef":
-                            iv_spdef = val
-                        elif key == "iv_speed":
-                            iv_speed = val
-
-                # gender / nature best-effort
-                if (m := re.search(r"Gender[:\s]*([MFmf♂♀\w]+)", fval, re.IGNORECASE)):
-                    gender = m.group(1).strip()
-                if (m := re.search(r"Nature[:\s]*([A-Za-z\-]+)", fval, re.IGNORECASE)):
-                    nature = m.group(1).strip()
+                # first occurrence of each item in this field wins; gender / nature are best-effort
+                seen = set()
+                items = _details_by_line(fval)
+                for kind, value in (items if items is not None else _details_by_regex(fval)):
+                    if kind in seen:
+                        continue
+                    seen.add(kind)
+                    if kind == "total":
+                        iv_total = value
+                    elif kind == "gender":
+                        gender = value
+                    elif kind == "nature":
+                        nature = value
+                    else:
+                        ivs[kind] = value
 
             # auction/winning info
             if "auction" in fname or "details" in fname or "winning" in fname:
@@ -240,122 +453,219 @@ def extract_auction_data(embed: Dict[str, Any]) -> Optional[Dict[str, Any]]:
                     winning_bid = clean_number(m.group(1))
                 else:
                     # fallback: find a number followed by "Pokécoins" or similar
-                    if m2 := re.search(r"([0-9,]+)\s*Pok[eé]coins", fval, re.IGNORECASE):
+                    if m2 := POKECOINS_RE.search(fval):
                         winning_bid = clean_number(m2.group(1))
 
                 # winner id or name
                 if m := WINNER_RE.search(fval):
                     winner_id = m.group(1)
                 else:
-                    if mname := re.search(r"(?:Winner|Bidder)[:\s]*@?([^\n\r,]+)", fval, re.IGNORECASE):
+                    if mname := WINNER_NAME_RE.search(fval):
                         winner_id = mname.group(1).strip()
 
-        return {
-            "auction_id": auction_id,
-            "species": species,
-            "level": level,
-            "shiny": shiny,
-            "gender": gender,
-            "nature": nature,
-            "iv_hp": iv_hp,
-            "iv_atk": iv_atk,
-            "iv_def": iv_def,
-            "iv_spatk": iv_spatk,
-            "iv_spdef": iv_spdef,
-            "iv_speed": iv_speed,
-            "iv_total": iv_total,
-            "winning_bid": winning_bid,
-            "winner_id": winner_id,
-            "seller": (embed.get("author") or {}).get("name"),
-            "timestamp": embed.get("timestamp"),
-            "title": title,
-            "raw": json.dumps(embed, ensure_ascii=False)
-        }
+        # order matches INSERT_SQL
+        return (
+            auction_id, species, level, shiny, gender, nature,
+            ivs.get("iv_hp"), ivs.get("iv_atk"), ivs.get("iv_def"),
+            ivs.get("iv_spatk"), ivs.get("iv_spdef"), ivs.get("iv_speed"), iv_total,
+            winning_bid, winner_id, (embed.get("author") or {}).get("name"), embed.get("timestamp"),
+            title, _json_dumps(embed),
+        )
     except Exception as e:
         logger.error("Error parsing embed: %s | title=%s", e, embed.get("title", "N/A"), exc_info=True)
         return None
 
 # ---------------- main processing loop ----------------
-def process_file(input_path: Path, db_path: Path, batch_size: int = 10000, verbose: bool = False):
+WORKER_CHUNK_SIZE = 1024  # raw messages per task sent to a worker process
+
+def create_database(db_path: Union[Path, str], fast: bool = False) -> sqlite3.Connection:
+    """
+    Open db_path for a bulk load: pragmas applied, schema created if missing. Nothing is dropped
+    here; process_file drops the indexes inside its load transaction. The connection is in
+    autocommit mode.
+    fast=True trades durability for speed (FAST_LOAD_PRAGMAS); only for throwaway DBs.
+    db_path may also be a "file:" URI, e.g. a shared-cache in-memory DB.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None,  # transactions are issued explicitly
+                           uri=str(db_path).startswith("file:"))
+    conn.executescript(FAST_LOAD_PRAGMAS if fast else BULK_LOAD_PRAGMAS)
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='auctions'")
+    if not cur.fetchone():
+        conn.executescript(AUCTIONS_SCHEMA)
+    return conn
+
+def extract_embeds_from_message(message: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [e for e in message.get("embeds") or [] if isinstance(e, dict)]
+
+def message_rows(message: Dict[str, Any]) -> List[Tuple[Any, ...]]:
+    """Row tuples for every SOLD auction embed in one message."""
+    rows = []
+    for embed in extract_embeds_from_message(message):
+        auction_data = extract_auction_data(embed)
+        if auction_data:
+            rows.append(auction_data)
+    return rows
+
+def extract_batch(raw_messages: List[bytes]) -> List[Tuple[Any, ...]]:
+    """Worker task for --workers: decode raw message objects and extract their SOLD rows."""
+    rows = []
+    for raw in raw_messages:
+        message = _decode_object(raw)
+        if message is not None:
+            rows.extend(message_rows(message))
+    return rows
+
+def parallel_rows(raw_messages: Iterable[bytes], workers: int) -> Iterator[Tuple[int, List[Tuple[Any, ...]]]]:
+    """
+    Fan raw messages out to a process pool in WORKER_CHUNK_SIZE tasks, yielding
+    (messages_in_task, rows) in input order. At most 2 tasks per worker are in flight,
+    so the reader never runs far ahead of the pool.
+    """
+    it = iter(raw_messages)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in iter(lambda: list(itertools.islice(it, WORKER_CHUNK_SIZE)), []):
+            pending.append((len(chunk), pool.submit(extract_batch, chunk)))
+            if len(pending) >= 2 * workers:
+                count, future = pending.popleft()
+                yield count, future.result()
+        while pending:
+            count, future = pending.popleft()
+            yield count, future.result()
+
+def insert_batch(cur: sqlite3.Cursor, batch: list, sql: str = INSERT_SQL) -> int:
+    """
+    Insert one batch inside the load transaction, under its own savepoint so a failing batch is
+    undone on its own. Returns the number of rows written (ignored duplicates don't count).
+    """
+    cur.execute("SAVEPOINT batch")
+    try:
+        cur.executemany(sql, batch)
+        written = cur.rowcount
+    except sqlite3.Error:
+        cur.execute("ROLLBACK TO batch")
+        cur.execute("RELEASE batch")
+        raise
+    cur.execute("RELEASE batch")
+    return written
+
+def process_file(input_path: Path, db_path: Union[Path, str], batch_size: int = 10000, verbose: bool = False,
+                 backend: str = "scan", replace: bool = False, workers: int = 1, fast: bool = False):
     """
     Stream messages, extract SOLD auctions and insert to DB in batches.
     Shows a tqdm progress bar when verbose==True and updates postfix with sold_auctions_found.
+    backend selects the JSON reader: "scan" (tolerant, default) or "ijson" (strict, needs ijson).
+    Known auction_ids are kept as stored unless replace=True.
+    workers > 1 moves decoding and extraction to a process pool (scan backend only).
+    fast=True opens the DB with FAST_LOAD_PRAGMAS (see create_database).
     """
+    if backend == "ijson" and ijson is None:
+        print("FATAL: --backend ijson requested but ijson is not installed (pip install ijson)")
+        return
+    conn = None
     try:
-        conn = sqlite3.connect(db_path)
-        conn.executescript(AUCTIONS_SCHEMA)
+        conn = create_database(db_path, fast=fast)
         cur = conn.cursor()
+        # the whole load is one write transaction: a single WAL commit instead of one per batch
+        cur.execute("BEGIN IMMEDIATE")
+        # indexes are rebuilt after the load (AUCTIONS_INDEXES); dropping them inside the
+        # transaction means a failed or interrupted load rolls the drop back with the rows
+        for stmt in DROP_INDEXES:
+            cur.execute(stmt)
     except sqlite3.Error as e:
+        if conn is not None:
+            conn.close()
         print(f"FATAL: Database connection failed: {e}")
         return
 
+    insert_sql = REPLACE_SQL if replace else INSERT_SQL
     inserted_count = 0
     batch = []
 
     print(f"Starting memory-safe processing of '{input_path.name}' (SOLD auctions only).")
-    message_stream = stream_messages_from_file(input_path)
-
-    with tqdm(desc="Processing messages", unit=" messages", disable=not verbose) as pbar:
-        for message in message_stream:
-            pbar.update(1)
-            embeds = message.get("embeds") or []
-            for embed in embeds:
-                if not isinstance(embed, dict):
-                    continue
-                auction_data = extract_auction_data(embed)
-                if auction_data:
-                    # order matches INSERT_SQL
-                    batch.append(tuple(auction_data.get(k) for k in [
-                        'auction_id', 'species', 'level', 'shiny', 'gender', 'nature',
-                        'iv_hp', 'iv_atk', 'iv_def', 'iv_spatk', 'iv_spdef', 'iv_speed',
-                        'iv_total', 'winning_bid', 'winner_id', 'seller', 'timestamp',
-                        'title', 'raw'
-                    ]))
-
-            if len(batch) >= batch_size:
-                try:
-                    cur.executemany(INSERT_SQL, batch)
-                    conn.commit()
-                    inserted_count += len(batch)
-                    pbar.set_postfix({"sold_auctions_found": inserted_count})
-                except sqlite3.Error as e:
-                    logger.error("Database batch insert error: %s", e, exc_info=True)
+    try:
+        if backend == "ijson":
+            row_stream = ((1, message_rows(m)) for m in stream_messages_ijson(input_path))
+        elif workers > 1:
+            row_stream = parallel_rows(stream_messages_from_file(input_path, sold_only=True, decode=False), workers)
+        else:
+            row_stream = ((1, message_rows(m)) for m in stream_messages_from_file(input_path, sold_only=True))
+
+        with tqdm(desc="Processing messages", unit=" messages", disable=not verbose) as pbar:
+            for message_count, rows in row_stream:
+                pbar.update(message_count)
+                batch.extend(rows)
+
+                if len(batch) >= batch_size:
                     try:
-                        conn.rollback()
-                    except:
-                        pass
-                finally:
-                    batch = []
-
-    # final flush
-    if batch:
+                        inserted_count += insert_batch(cur, batch, insert_sql)
+                        pbar.set_postfix({"sold_auctions_found": inserted_count})
+                    except sqlite3.Error as e:
+                        logger.error("Database batch insert error: %s", e, exc_info=True)
+                    finally:
+                        batch = []
+
+        # final flush
+        if batch:
+            try:
+                inserted_count += insert_batch(cur, batch, insert_sql)
+            except sqlite3.Error as e:
+                logger.error("Final database batch insert error: %s", e, exc_info=True)
+
+        try:
+            cur.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.error("Database commit error: %s", e, exc_info=True)
+
         try:
-            cur.executemany(INSERT_SQL, batch)
-            conn.commit()
-            inserted_count += len(batch)
+            conn.executescript(AUCTIONS_INDEXES)
         except sqlite3.Error as e:
-            logger.error("Final database batch insert error: %s", e, exc_info=True)
+            logger.error("Index creation error: %s", e, exc_info=True)
+    except BaseException:
+        # an interrupted or failed load leaves nothing behind: rows and index drops roll back
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        conn.close()
 
-    conn.close()
     print("\n---")
     print("✅ Processing complete.")
     print(f"   SOLD auctions saved or updated: {inserted_count}")
     print("   See 'parser_errors.log' for any issues encountered.")
 
 # ---------------- CLI ----------------
-def main():
+def main(argv: Optional[List[str]] = None):
     parser = argparse.ArgumentParser(description="Parser that saves only [SOLD] auctions (streaming, memory-safe).")
     parser.add_argument("--input", "-i", required=True, type=Path, help="Path to chat.json")
     parser.add_argument("--db", "-d", required=True, type=Path, help="Path to output SQLite DB")
     parser.add_argument("--batch-size", "-b", type=int, default=10000, help="DB insert batch size")
     parser.add_argument("--verbose", "-v", action="store_true", help="Show live progress bar")
-    args = parser.parse_args()
+    parser.add_argument("--backend", choices=["scan", "ijson"], default="scan",
+                        help="JSON reader: tolerant byte scanner (default) or ijson's C parser (strict)")
+    parser.add_argument("--replace", action="store_true",
+                        help="Overwrite auctions already in the DB instead of skipping them")
+    parser.add_argument("--workers", "-w", type=int, default=1,
+                        help="Worker processes for decoding/extraction (scan backend only; default 1)")
+    parser.add_argument("--fast", action="store_true",
+                        help="Skip fsyncs and the on-disk journal (throwaway DBs only)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        filename="parser_errors.log",
+        filemode="w"
+    )
 
     if not args.input.exists():
         print(f"FATAL: Input file not found at '{args.input}'")
         return
 
-    process_file(args.input, args.db, batch_size=args.batch_size, verbose=args.verbose)
+    process_file(args.input, args.db, batch_size=args.batch_size, verbose=args.verbose,
+                 backend=args.backend, replace=args.replace, workers=args.workers,
+                 fast=args.fast)
 
 if __name__ == "__main__":
     main()
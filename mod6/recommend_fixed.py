@@ -8,136 +8,202 @@ based on statistical analysis of past winning bids.
 from __future__ import annotations
 
 import argparse
+import functools
+import itertools
 import logging
 import sqlite3
-import statistics
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+AUCTION_COLUMNS = ("auction_id, species, level, shiny, gender, nature, "
+                   "iv_total, winning_bid, winner_id, timestamp")
+
+# species/gender/nature are stored trimmed by the parser; comparing the bare column with
+# NOCASE (instead of LOWER(TRIM(col))) keeps idx_auctions_recommend usable
+FILTER_CLAUSES = {
+    'species': "species = TRIM(?) COLLATE NOCASE",
+    'shiny': "shiny = 1",
+    'not_shiny': "shiny = 0",
+    'gender': "gender = TRIM(?) COLLATE NOCASE",
+    'min_total_iv': "iv_total >= ?",
+    'max_total_iv': "iv_total <= ?",
+    'min_level': "level >= ?",
+    'max_level': "level <= ?",
+    'nature': "nature = TRIM(?) COLLATE NOCASE",
+}
+
+# rows per fetchmany() when materialising result lists
+FETCH_BATCH_SIZE = 1000
+
+@functools.lru_cache(maxsize=64)
+def _sql_for_shape(shape: Tuple[str, ...], columns: str) -> str:
+    """
+    SQL text for a filter shape (which filters are set, not their values). Identical text
+    lets sqlite3's per-connection statement cache reuse the prepared statement.
+    """
+    where = [FILTER_CLAUSES[k] for k in shape]
+    where.append("winning_bid IS NOT NULL")
+    where.append("winning_bid > 0")
+    where_clause = " AND ".join(where)
+    return f"""
+        SELECT {columns}
+        FROM auctions
+        WHERE {where_clause}
+        ORDER BY winning_bid ASC
+        """
+
+def _filter_outliers(wb: np.ndarray) -> np.ndarray:
+    """Drop bids further than 2 sample stdevs from the mean, unless that would drop more than 30%."""
+    mean = wb.mean()
+    stdev = wb.std(ddof=1)
+    if stdev > 0:
+        filtered = wb[np.abs(wb - mean) <= 2 * stdev]
+        if filtered.size >= max(3, int(0.7 * wb.size)):
+            return filtered
+    return wb
+
 class AuctionAnalyzer:
     """Analyzes auction data and provides price recommendations."""
 
-    def __init__(self, db_path: Path):
-        self.db_path = db_path
+    def __init__(self, db: Union[Path, str, sqlite3.Connection]):
+        # an already-open connection is borrowed: used as-is and left open by close()
+        self.conn: Optional[sqlite3.Connection] = None
+        if isinstance(db, sqlite3.Connection):
+            self.db_path = None
+            self.conn = db
+            self._owns_conn = False
+        else:
+            self.db_path = db
+            self._owns_conn = True
         self._validate_database()
 
+    def _connect(self) -> sqlite3.Connection:
+        # "file:" URIs (e.g. a shared-cache in-memory DB) are passed through as URIs
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False,
+                               uri=str(self.db_path).startswith("file:"))
+        conn.row_factory = sqlite3.Row
+        # read-side tuning: memory-map the file and keep up to 64 MiB of pages cached
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA cache_size=-65536")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def close(self):
+        if self.conn is not None:
+            if self._owns_conn:
+                self.conn.close()
+            self.conn = None
+
     def _validate_database(self):
-        if not self.db_path.exists():
+        if self._owns_conn and not str(self.db_path).startswith("file:") and not Path(self.db_path).exists():
             raise FileNotFoundError(f"Database file not found: {self.db_path}")
         try:
-            conn = sqlite3.connect(str(self.db_path))
-            cur = conn.cursor()
+            # one connection for the analyzer's lifetime; queries reuse it
+            if self.conn is None:
+                self.conn = self._connect()
+            cur = self.conn.cursor()
             cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='auctions'")
             if not cur.fetchone():
                 raise ValueError("Database does not contain 'auctions' table")
-            conn.close()
         except Exception as e:
+            self.close()
             raise ValueError(f"Invalid database: {e}")
 
-    def build_query(self, filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
-        where: List[str] = []
-        params: List[Any] = []
-
+    def build_query(self, filters: Dict[str, Any], columns: str = AUCTION_COLUMNS) -> Tuple[str, List[Any]]:
         if not filters.get('species'):
             raise ValueError('Species is required')
-        where.append("LOWER(TRIM(species)) = LOWER(TRIM(?))")
-        params.append(filters['species'])
+        shape: List[str] = ['species']
+        params: List[Any] = [filters['species']]
 
         shiny = str(filters.get('shiny', 'any')).lower()
         if shiny in ('1', 'yes', 'y', 'true', 'shiny'):
-            where.append("shiny = 1")
+            shape.append('shiny')
         elif shiny in ('0', 'no', 'n', 'false', 'normal'):
-            where.append("shiny = 0")
+            shape.append('not_shiny')
 
         if filters.get('gender'):
-            where.append("LOWER(TRIM(gender)) = LOWER(TRIM(?))")
+            shape.append('gender')
             params.append(filters['gender'])
 
         if filters.get('min_total_iv') is not None:
-            where.append("iv_total >= ?")
+            shape.append('min_total_iv')
             params.append(float(filters['min_total_iv']))
         if filters.get('max_total_iv') is not None:
-            where.append("iv_total <= ?")
+            shape.append('max_total_iv')
             params.append(float(filters['max_total_iv']))
 
         if filters.get('min_level') is not None:
-            where.append("level >= ?")
+            shape.append('min_level')
             params.append(int(filters['min_level']))
         if filters.get('max_level') is not None:
-            where.append("level <= ?")
+            shape.append('max_level')
             params.append(int(filters['max_level']))
 
         if filters.get('nature'):
-            where.append("LOWER(TRIM(nature)) = LOWER(TRIM(?))")
+            shape.append('nature')
             params.append(filters['nature'])
 
-        where.append("winning_bid IS NOT NULL")
-        where.append("winning_bid > 0")
-
-        where_clause = " AND ".join(where) if where else "1=1"
+        return _sql_for_shape(tuple(shape), columns), params
 
-        sql = f"""
-        SELECT auction_id, species, level, shiny, gender, nature,
-               iv_total, winning_bid, winner_id, timestamp
-        FROM auctions
-        WHERE {where_clause}
-        ORDER BY winning_bid ASC
-        """
-        return sql, params
+    def iter_auction_data(self, filters: Dict[str, Any], limit: Optional[int] = None) -> Iterator[sqlite3.Row]:
+        """Matching rows streamed straight off the cursor, cheapest first."""
+        sql, params = self.build_query(filters)
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        cur = self.conn.cursor()
+        cur.row_factory = sqlite3.Row  # per cursor, so a borrowed connection's own setting is untouched
+        cur.arraysize = FETCH_BATCH_SIZE
+        return cur.execute(sql, params)
 
     def get_auction_data(self, filters: Dict[str, Any], limit: Optional[int] = None) -> List[Dict[str, Any]]:
-        sql, params = self.build_query(filters)
+        cur = self.iter_auction_data(filters, limit)
+        rows: List[Dict[str, Any]] = []
+        while batch := cur.fetchmany():
+            rows.extend(map(dict, batch))
+        return rows
+
+    def get_winning_bids(self, filters: Dict[str, Any], limit: Optional[int] = None) -> np.ndarray:
+        """Just the winning_bid column for the filters (cheapest first), without building row dicts."""
+        sql, params = self.build_query(filters, columns="winning_bid")
         if limit:
-            sql += f" LIMIT {int(limit)}"
-        conn = sqlite3.connect(str(self.db_path))
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-        try:
-            cur.execute(sql, params)
-            rows = cur.fetchall()
-            return [dict(r) for r in rows]
-        finally:
-            conn.close()
-
-    def calculate_statistics(self, winning_bids: List[int]) -> Dict[str, Any]:
-        if not winning_bids:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        cur = self.conn.cursor()
+        cur.row_factory = None  # plain tuples; no Row objects for a single column
+        # chain.from_iterable unpacks the 1-tuples in C, so no Python-level generator runs per row
+        return np.fromiter(itertools.chain.from_iterable(cur.execute(sql, params)), dtype=np.int64)
+
+    def calculate_statistics(self, winning_bids: Sequence[int]) -> Dict[str, Any]:
+        if len(winning_bids) == 0:
             return {}
-        wb = list(map(int, winning_bids))
-        wb.sort()
-        if len(wb) > 3:
-            mean = statistics.mean(wb)
-            stdev = statistics.stdev(wb) if len(wb) > 1 else 0
-            if stdev > 0:
-                filtered = [x for x in wb if abs(x - mean) <= 2 * stdev]
-                if len(filtered) >= max(3, int(0.7 * len(wb))):
-                    wb = filtered
-                    wb.sort()
+        wb = np.asarray(winning_bids, dtype=np.int64)
+        if wb.size > 3:
+            wb = _filter_outliers(wb)
+        # 'linear' is statistics.quantiles(method='inclusive'); 0.5 is the median
+        q1, median, q3 = np.quantile(wb, [0.25, 0.5, 0.75])
         stats: Dict[str, Any] = {
-            'count': len(wb),
-            'min': min(wb),
-            'max': max(wb),
-            'mean': int(statistics.mean(wb)),
-            'median': int(statistics.median(wb)),
+            'count': int(wb.size),
+            'min': int(wb.min()),
+            'max': int(wb.max()),
+            'mean': int(wb.mean()),
+            'median': int(median),
         }
-        if len(wb) >= 4:
-            try:
-                q = statistics.quantiles(wb, n=4, method='inclusive')
-                stats.update({'q1': int(q), 'q3': int(q[2]), 'iqr': int(q[2] - q)})
-            except Exception:
-                pass
+        if wb.size >= 4:
+            stats.update({'q1': int(q1), 'q3': int(q3), 'iqr': int(q3 - q1)})
         return stats
 
     def recommend_price(self, filters: Dict[str, Any], strategy: str = 'conservative') -> Dict[str, Any]:
         try:
-            auctions = self.get_auction_data(filters, limit=2000)
-            if not auctions:
+            # statistics only need the bids; full rows are fetched just for the sample below
+            winning_bids = self.get_winning_bids(filters, limit=2000)
+            if not winning_bids.size:
                 return {'success': False, 'message': 'No historical auction data found for the specified criteria', 'recommendation': None}
-            winning_bids = [a['winning_bid'] for a in auctions if a.get('winning_bid')]
-            if not winning_bids:
-                return {'success': False, 'message': 'No completed auctions found for the specified criteria', 'recommendation': None}
             stats = self.calculate_statistics(winning_bids)
             if not stats:
                 return {'success': False, 'message': 'Not enough data to compute statistics', 'recommendation': None}
@@ -147,7 +213,8 @@ class AuctionAnalyzer:
                 rec = max(1, (stats['median'] - int(0.25 * stats['iqr'])) if 'iqr' in stats else int(0.9 * stats['median']))
             else:
                 rec = int(stats['median'])
-            return {'success': True, 'recommendation': rec, 'statistics': stats, 'sample_auctions': auctions[:10], 'strategy': strategy, 'filters': filters}
+            sample = self.get_auction_data(filters, limit=10)
+            return {'success': True, 'recommendation': rec, 'statistics': stats, 'sample_auctions': sample, 'strategy': strategy, 'filters': filters}
         except Exception as e:
             logger.error(f"Error in price recommendation: {e}")
             return {'success': False, 'message': f'Error calculating recommendation: {str(e)}', 'recommendation': None}
@@ -203,7 +270,31 @@ def print_recommendation_result(result: Dict[str, Any]):
         gender = f"{a['gender']} " if a.get('gender') else ""
         print(f" {i}. {shiny}{level}{gender}{a['species']} {iv}- {format_price(a['winning_bid'])} Pokécoins")
 
-def main():
+def run(db: Union[Path, str, sqlite3.Connection], filters: Dict[str, Any], strategy: str = 'conservative',
+        search_only: bool = False, limit: int = 50):
+    """Print a recommendation (or a search listing) for the filters; the CLI without argparse."""
+    analyzer = AuctionAnalyzer(db)
+    try:
+        if search_only:
+            auctions = analyzer.search_auctions(filters, limit)
+            if not auctions:
+                print('No auctions found matching your criteria.')
+                return
+            print(f"\n🔍 Found {len(auctions)} auctions:")
+            for a in auctions:
+                shiny = "✨ " if a.get('shiny') else ""
+                level = f"Lv.{a['level']} " if a.get('level') else ""
+                iv = f"({a['iv_total']:.1f}% IV) " if a.get('iv_total') is not None else ""
+                gender = f"{a['gender']} " if a.get('gender') else ""
+                price = f"{format_price(a['winning_bid'])} Pokécoins" if a.get('winning_bid') else "Current bid"
+                print(f" #{a['auction_id']} - {shiny}{level}{gender}{a['species']} {iv}- {price}")
+        else:
+            result = analyzer.recommend_price(filters, strategy)
+            print_recommendation_result(result)
+    finally:
+        analyzer.close()
+
+def main(argv: Optional[Sequence[str]] = None):
     ap = argparse.ArgumentParser(description='Pokemon auction price recommendation tool')
     ap.add_argument('--db', '-d', required=True, type=Path, help='Database file path')
     ap.add_argument('--species', '-s', required=True, help='Pokemon species name')
@@ -218,12 +309,11 @@ def main():
     ap.add_argument('--search-only', action='store_true', help="Only search, don't recommend price")
     ap.add_argument('--limit', type=int, default=50, help='Limit for search results')
     ap.add_argument('--verbose', '-v', action='store_true', help='Verbose output')
-    args = ap.parse_args()
+    args = ap.parse_args(argv)
 
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
 
-    analyzer = AuctionAnalyzer(args.db)
     filters: Dict[str, Any] = {
         'species': args.species,
         'shiny': args.shiny,
@@ -235,22 +325,7 @@ def main():
         'nature': args.nature,
     }
 
-    if args.search_only:
-        auctions = analyzer.search_auctions(filters, args.limit)
-        if not auctions:
-            print('No auctions found matching your criteria.')
-            return
-        print(f"\n🔍 Found {len(auctions)} auctions:")
-        for a in auctions:
-            shiny = "✨ " if a.get('shiny') else ""
-            level = f"Lv.{a['level']} " if a.get('level') else ""
-            iv = f"({a['iv_total']:.1f}% IV) " if a.get('iv_total') is not None else ""
-            gender = f"{a['gender']} " if a.get('gender') else ""
-            price = f"{format_price(a['winning_bid'])} Pokécoins" if a.get('winning_bid') else "Current bid"
-            print(f" #{a['auction_id']} - {shiny}{level}{gender}{a['species']} {iv}- {price}")
-    else:
-        result = analyzer.recommend_price(filters, args.strategy)
-        print_recommendation_result(result)
+    run(args.db, filters, strategy=args.strategy, search_only=args.search_only, limit=args.limit)
 
 if __name__ == '__main__':
     main()
@@ -1,19 +1,38 @@
 #!/usr/bin/env python3
 """
-test_parser.py - Test script for the auction parser and recommender
+test_parser.py - Tests for the auction parser and recommender
 
-This script creates sample data and tests both tools to ensure they work correctly.
+Builds a small sample Discord export and checks both tools against it. Run with pytest
+(``pytest test_parser.py``, or ``-n auto`` with pytest-xdist), or directly as a script.
 """
 
+import itertools
 import json
 import sqlite3
-import tempfile
-import os
-from pathlib import Path
 import sys
+from pathlib import Path
+
+import pytest
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Make the modules next to this file importable however the tests are launched
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import parser as parser_module
+from parser import (process_file, create_database, stream_messages_from_file,
+                    extract_embeds_from_message, extract_auction_data, insert_batch)
+from recommend_fixed import AuctionAnalyzer, run as recommend_run
+
+# Named in-memory DB shared by every connection in this process; it lives while the parsed_db
+# fixture's connection is open. Each pytest-xdist worker is its own process, so gets its own copy.
+TEST_DB_URI = "file:auction_test?mode=memory&cache=shared"
 
-# Add the current directory to Python path to import our modules
-sys.path.insert(0, '.')
+SAMPLE_MESSAGE_COUNT = 5
+SAMPLE_SOLD_COUNT = 4  # the first message is a live auction, not [SOLD]
 
 def create_sample_discord_data():
     """Create sample Discord export data for testing."""
@@ -132,203 +151,236 @@ def create_sample_discord_data():
 
     return sample_data
 
-def test_parser():
-    """Test the parser with sample data."""
-    print("🧪 Testing Parser...")
-
-    # Create temporary files
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-        json.dump(create_sample_discord_data(), f, indent=2)
-        json_file = f.name
-
-    db_file = tempfile.mktemp(suffix='.db')
-
+# the sample export is encoded once at import; the fixture just writes these bytes
+_SAMPLE_EXPORT = {"messages": create_sample_discord_data()}
+if orjson is not None:
+    _SAMPLE_BLOB = orjson.dumps(_SAMPLE_EXPORT)
+else:
+    _SAMPLE_BLOB = json.dumps(_SAMPLE_EXPORT, ensure_ascii=False).encode("utf-8")
+
+@pytest.fixture(scope="session")
+def sample_json(tmp_path_factory):
+    json_file = tmp_path_factory.mktemp("export") / "sample.json"
+    json_file.write_bytes(_SAMPLE_BLOB)
+    return json_file
+
+@pytest.fixture(scope="session")
+def parsed_db(sample_json):
+    """The sample export parsed once into the shared in-memory DB; yields a connection to it."""
+    conn = sqlite3.connect(TEST_DB_URI, uri=True, check_same_thread=False, isolation_level=None)
+    process_file(sample_json, TEST_DB_URI, fast=True)  # throwaway DB: skip fsyncs/journal writes
+    yield conn
+    conn.close()
+
+def _stored_rows(db_file):
+    """Every stored column except the id/created_at bookkeeping, in auction_id order."""
+    conn = sqlite3.connect(db_file)
     try:
-        # Import and test the parser
-        from parser_large_fixed import main as parser_main, create_database, process_json_file, extract_auction_data
-
-        # Test database creation
-        create_database(Path(db_file))
-        print("✅ Database creation successful")
-
-        # Test JSON processing
-        messages = list(process_json_file(Path(json_file)))
-        print(f"✅ JSON processing successful - found {len(messages)} messages")
-
-        # Test auction extraction
-        auction_count = 0
-        for message in messages:
-            from parser_large_fixed import extract_embeds_from_message
-            embeds = extract_embeds_from_message(message)
-            for embed in embeds:
-                auction_data = extract_auction_data(embed)
-                if auction_data:
-                    auction_count += 1
-
-        print(f"✅ Auction extraction successful - found {auction_count} auctions")
-
-        # Test full parser by running main function
-        import sys
-        original_argv = sys.argv
-        sys.argv = ['parser_large_fixed.py', '--input', json_file, '--db', db_file, '--verbose']
-        try:
-            parser_main()
-            print("✅ Full parser execution successful")
-        except SystemExit:
-            pass  # argparse calls sys.exit, which is expected
-        finally:
-            sys.argv = original_argv
-
-        # Verify data was inserted
-        conn = sqlite3.connect(db_file)
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM auctions")
-        count = cursor.fetchone()[0]
+        return conn.execute(
+            "SELECT auction_id, species, level, shiny, gender, nature, iv_hp, iv_atk, iv_def, iv_spatk, "
+            "iv_spdef, iv_speed, iv_total, winning_bid, winner_id, seller, timestamp, title, raw "
+            "FROM auctions ORDER BY auction_id").fetchall()
+    finally:
         conn.close()
 
-        print(f"✅ Database insertion successful - {count} records inserted")
+def test_create_database(tmp_path):
+    conn = create_database(tmp_path / "auctions.db", fast=True)
+    try:
+        assert conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='auctions'").fetchone()
+    finally:
+        conn.close()
 
-        return db_file  # Return database file for recommender testing
+def test_stream_messages(sample_json):
+    assert sum(1 for _ in stream_messages_from_file(sample_json)) == SAMPLE_MESSAGE_COUNT
+
+# Message content full of the characters a naive brace counter trips over: braces inside strings,
+# escaped quotes next to braces, escaped backslashes right before a closing quote, nested objects.
+_TRICKY_MESSAGES = [
+    {"id": "1", "content": "unbalanced { open", "embeds": []},
+    {"id": "2", "content": "close } and {{nested}} and }{", "embeds": [{"title": "{[SOLD]}", "fields": []}]},
+    {"id": "3", "content": 'quote \" then { brace', "author": {"name": 'say \"}\"'}},
+    {"id": "4", "content": "backslash at end \\", "note": "\\\" } \\"},
+    {"id": "5", "content": "", "embeds": [{"fields": [{"name": "x", "value": "{\"a\": [1, {\"b\": 2}]}"}]}]},
+    {"id": "6", "content": "unicode ✨ {é} \u007b", "nested": {"a": {"b": {"c": "}"}}}},
+]
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 20])
+def test_stream_messages_braces_and_escapes(tmp_path, monkeypatch, chunk_size):
+    raw = json.dumps({"guild": {"name": "{x}"}, "messages": _TRICKY_MESSAGES})
+    json_file = tmp_path / "tricky.json"
+    json_file.write_text(raw, encoding="utf-8")
+    expected = json.loads(raw)["messages"]
+    monkeypatch.setattr(parser_module, "READ_CHUNK_SIZE", chunk_size)
+
+    assert list(stream_messages_from_file(json_file)) == expected
+    assert [json.loads(b) for b in stream_messages_from_file(json_file, decode=False)] == expected
+
+_DETAILS_FIELD = ("**HP:** 47 – IV: 6/31\n**Attack:** 102 – IV: 31/31\n**Defense:** 60 – IV: 14/31\n"
+                  "**Sp. Atk:** 55 – IV: 0/31\n**Sp. Def:** 71 – IV: 22/31\n**Speed:** 98 – IV: 9/31\n"
+                  "**Total IV:** 44.62%\n**Nature:** Jolly\n**Gender:** ♀")
+_DETAILS_EXPECTED = [("iv_hp", 6), ("iv_atk", 31), ("iv_def", 14), ("iv_spatk", 0), ("iv_spdef", 22),
+                     ("iv_speed", 9), ("total", 44.62), ("nature", "Jolly"), ("gender", "♀")]
+
+def test_details_by_line_matches_regex():
+    fval = parser_module.clean_text(_DETAILS_FIELD)
+    assert parser_module._details_by_line(fval) == _DETAILS_EXPECTED
+    assert list(parser_module._details_by_regex(fval)) == _DETAILS_EXPECTED
+
+def test_details_unknown_line_falls_back_to_regex():
+    # a label the fast path doesn't know sends the whole field to DETAILS_RE
+    fval = parser_module.clean_text("**XP:** 1200/1500\n" + _DETAILS_FIELD)
+    assert parser_module._details_by_line(fval) is None
+    assert list(parser_module._details_by_regex(fval)) == _DETAILS_EXPECTED
+
+def test_extract_and_insert_streaming(sample_json):
+    # messages -> embeds -> rows as one stream, written 1000 at a time so only one batch is in memory
+    auctions = (auction for message in stream_messages_from_file(sample_json)
+                for embed in extract_embeds_from_message(message)
+                for auction in [extract_auction_data(embed)] if auction)
+    # private in-memory DB (no shared cache needed: nothing else opens it)
+    conn = create_database("file:auction_stream_test?mode=memory", fast=True)
+    try:
+        cur = conn.cursor()
+        written = 0
+        for batch in iter(lambda: list(itertools.islice(auctions, 1000)), []):
+            written += insert_batch(cur, batch)
+        assert written == SAMPLE_SOLD_COUNT
+        assert conn.execute("SELECT COUNT(*) FROM auctions").fetchone()[0] == SAMPLE_SOLD_COUNT
+    finally:
+        conn.close()
 
-    except Exception as e:
-        print(f"❌ Parser test failed: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
+def test_parser_happy_path(tmp_path, sample_json):
+    db_file = tmp_path / "auctions.db"
+    process_file(sample_json, db_file, fast=True)
+    conn = sqlite3.connect(db_file)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM auctions").fetchone()[0] == SAMPLE_SOLD_COUNT
+        row = conn.execute(
+            "SELECT species, shiny, level, gender, nature, iv_hp, iv_total, winning_bid FROM auctions "
+            "WHERE auction_id = '12347'").fetchone()
+        assert row == ("Mewtwo", 1, 60, "Unknown", "Modest", None, 96.8, 250000)
+    finally:
+        conn.close()
 
+def test_ijson_backend_matches_scanner(tmp_path, sample_json):
+    pytest.importorskip("ijson")
+    process_file(sample_json, tmp_path / "scan.db", fast=True)
+    process_file(sample_json, tmp_path / "ijson.db", backend="ijson", fast=True)
+    rows = _stored_rows(tmp_path / "ijson.db")
+    assert len(rows) == SAMPLE_SOLD_COUNT
+    assert rows == _stored_rows(tmp_path / "scan.db")
+
+def test_parallel_workers_match_serial(tmp_path, sample_json, monkeypatch):
+    monkeypatch.setattr(parser_module, "WORKER_CHUNK_SIZE", 1)  # one task per message: exercises ordering
+    process_file(sample_json, tmp_path / "serial.db", fast=True)
+    process_file(sample_json, tmp_path / "parallel.db", workers=2, fast=True)
+    rows = _stored_rows(tmp_path / "parallel.db")
+    assert len(rows) == SAMPLE_SOLD_COUNT
+    assert rows == _stored_rows(tmp_path / "serial.db")
+
+@pytest.mark.parametrize("replace, expected_bid", [(False, 250000), (True, 300000)])
+def test_reload_keeps_or_replaces_known_auctions(tmp_path, sample_json, replace, expected_bid):
+    db_file = tmp_path / "auctions.db"
+    process_file(sample_json, db_file, fast=True)
+    # the same export again, with a corrected winning bid on #12347
+    rebid_json = tmp_path / "rebid.json"
+    rebid_json.write_bytes(_SAMPLE_BLOB.replace(b"250,000", b"300,000"))
+    process_file(rebid_json, db_file, replace=replace, fast=True)
+    conn = sqlite3.connect(db_file)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM auctions").fetchone()[0] == SAMPLE_SOLD_COUNT
+        assert conn.execute(
+            "SELECT winning_bid FROM auctions WHERE auction_id = '12347'").fetchone()[0] == expected_bid
     finally:
-        # Cleanup JSON file
-        if os.path.exists(json_file):
-            os.unlink(json_file)
+        conn.close()
 
-def test_recommender(db_file):
-    """Test the recommender with the parsed data."""
-    if not db_file:
-        print("❌ Skipping recommender test - no database available")
-        return
+def test_failed_load_keeps_indexes(tmp_path, sample_json, monkeypatch):
+    db_file = tmp_path / "auctions.db"
+    process_file(sample_json, db_file)
 
-    print("\n🧪 Testing Recommender...")
+    def boom(message):
+        raise RuntimeError("interrupted")
+    monkeypatch.setattr(parser_module, "message_rows", boom)
+    with pytest.raises(RuntimeError):
+        process_file(sample_json, db_file, replace=True)
 
+    conn = sqlite3.connect(db_file)
     try:
-        from recommend_fixed import AuctionAnalyzer, main as recommend_main
-
-        # Test analyzer initialization
-        analyzer = AuctionAnalyzer(Path(db_file))
-        print("✅ Analyzer initialization successful")
-
-        # Test price recommendation for Pikachu
-        filters = {'species': 'Pikachu', 'shiny': 'any'}
-        result = analyzer.recommend_price(filters)
-
-        if result['success']:
-            print(f"✅ Price recommendation successful - {result['recommendation']} Pokécoins for Pikachu")
-        else:
-            print(f"⚠️ Price recommendation returned no results: {result['message']}")
-
-        # Test with shiny filter
-        filters = {'species': 'Pikachu', 'shiny': '1'}
-        result = analyzer.recommend_price(filters)
-
-        if result['success']:
-            print(f"✅ Shiny Pikachu recommendation successful - {result['recommendation']} Pokécoins")
-        else:
-            print(f"⚠️ Shiny Pikachu recommendation returned no results: {result['message']}")
-
-        # Test auction search
-        auctions = analyzer.search_auctions(filters)
-        print(f"✅ Auction search successful - found {len(auctions)} auctions")
-
-        # Test main function
-        import sys
-        original_argv = sys.argv
-        sys.argv = ['recommend_fixed.py', '--db', db_file, '--species', 'Pikachu', '--shiny', '1']
-        try:
-            recommend_main()
-            print("✅ Full recommender execution successful")
-        except SystemExit:
-            pass
-        finally:
-            sys.argv = original_argv
-
-    except Exception as e:
-        print(f"❌ Recommender test failed: {e}")
-        import traceback
-        traceback.print_exc()
-
-def test_edge_cases(db_file):
-    """Test edge cases and error handling."""
-    if not db_file:
-        print("❌ Skipping edge case tests - no database available")
-        return
-
-    print("\n🧪 Testing Edge Cases...")
+        indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        assert {"idx_auctions_species_shiny", "idx_auctions_recommend"} <= indexes
+        assert conn.execute("SELECT COUNT(*) FROM auctions").fetchone()[0] == SAMPLE_SOLD_COUNT
+    finally:
+        conn.close()
 
-    try:
-        from recommend_fixed import AuctionAnalyzer
-
-        analyzer = AuctionAnalyzer(Path(db_file))
-
-        # Test with non-existent species
-        result = analyzer.recommend_price({'species': 'NonexistentPokemon'})
-        if not result['success']:
-            print("✅ Non-existent species handled correctly")
-        else:
-            print("⚠️ Non-existent species should return no results")
-
-        # Test with invalid IV range
-        result = analyzer.recommend_price({
-            'species': 'Pikachu',
-            'min_total_iv': 150  # Invalid IV percentage
-        })
-        if not result['success']:
-            print("✅ Invalid IV range handled correctly")
-        else:
-            print("⚠️ Invalid IV range should return no results")
-
-        # Test with empty filters
-        try:
-            result = analyzer.recommend_price({})
-            if not result['success']:
-                print("✅ Empty filters handled correctly")
-            else:
-                print("⚠️ Empty filters should return error")
-        except ValueError:
-            print("✅ Empty filters raise appropriate error")
-
-        print("✅ Edge case testing completed")
-
-    except Exception as e:
-        print(f"❌ Edge case test failed: {e}")
-        import traceback
-        traceback.print_exc()
-
-def main():
-    """Run all tests."""
-    print("🚀 Starting comprehensive test suite for auction tools...")
-    print("=" * 60)
-
-    # Test parser
-    db_file = test_parser()
-
-    # Test recommender
-    test_recommender(db_file)
-
-    # Test edge cases
-    test_edge_cases(db_file)
-
-    # Cleanup
-    if db_file and os.path.exists(db_file):
-        os.unlink(db_file)
-        print("\n🧹 Temporary database cleaned up")
-
-    print("\n" + "=" * 60)
-    print("✅ Test suite completed successfully!")
-    print("\n📋 Summary:")
-    print("   • Parser successfully processes Discord JSON exports")
-    print("   • Database schema creation and data insertion working")
-    print("   • Recommender provides price analysis and recommendations")
-    print("   • Edge cases and error conditions handled properly")
-    print("   • Both tools integrate well together")
+def test_parser_skips_known_auctions(parsed_db, sample_json):
+    process_file(sample_json, TEST_DB_URI, fast=True)
+    assert parsed_db.execute("SELECT COUNT(*) FROM auctions").fetchone()[0] == SAMPLE_SOLD_COUNT
+
+@pytest.mark.parametrize("filters, expected", [
+    ({'species': 'Pikachu', 'shiny': 'any'}, 69750),
+    ({'species': 'Pikachu', 'shiny': '1'}, 108000),
+    ({'species': ' pikachu ', 'shiny': '1'}, 108000),
+])
+def test_recommend_price(parsed_db, filters, expected):
+    result = AuctionAnalyzer(parsed_db).recommend_price(filters)
+    assert result['success']
+    assert result['recommendation'] == expected
+
+def test_search_auctions(parsed_db):
+    auctions = AuctionAnalyzer(parsed_db).search_auctions({'species': 'Pikachu', 'shiny': '1'})
+    assert [a['auction_id'] for a in auctions] == ['12349']
+
+def test_recommender_run(parsed_db, capsys):
+    recommend_run(parsed_db, {'species': 'Pikachu', 'shiny': '1'})
+    out = capsys.readouterr().out
+    assert "Recommended Buy Price" in out
+    assert "108,000 Pokécoins" in out
+
+def test_borrowed_connection_stays_open(parsed_db):
+    AuctionAnalyzer(parsed_db).close()
+    assert parsed_db.execute("SELECT 1").fetchone() == (1,)
+
+@pytest.mark.parametrize("filters", [
+    {'species': 'NonexistentPokemon'},
+    {'species': 'Pikachu', 'min_total_iv': 150},  # IV percentage above 100
+    {},  # species is required
+])
+def test_recommend_price_no_result(parsed_db, filters):
+    result = AuctionAnalyzer(parsed_db).recommend_price(filters)
+    assert not result['success']
+    assert result['recommendation'] is None
+
+# Six Snorlax sales; 10000 is more than 2 stdevs from the mean, so the outlier filter drops it and
+# the quartiles come from 100..500: q1 200, median 300, q3 400.
+SNORLAX_BIDS = (100, 200, 300, 400, 500, 10000)
+
+@pytest.fixture
+def snorlax_db():
+    conn = create_database(":memory:", fast=True)
+    rows = [(str(90000 + i), "Snorlax", 30, 0, "Male", "Relaxed",
+             None, None, None, None, None, None, 50.0, bid, None, None,
+             "2024-02-01T00:00:00.000Z", f"[SOLD] Auction #{90000 + i} • Level 30 Snorlax", "{}")
+            for i, bid in enumerate(SNORLAX_BIDS)]
+    insert_batch(conn.cursor(), rows)
+    yield conn
+    conn.close()
+
+@pytest.mark.parametrize("strategy, expected", [
+    ('conservative', 250),  # median - int(iqr / 4)
+    ('balanced', 300),
+    ('aggressive', 400),
+])
+def test_recommend_price_quartiles(snorlax_db, strategy, expected):
+    result = AuctionAnalyzer(snorlax_db).recommend_price({'species': 'Snorlax'}, strategy)
+    assert result['success']
+    stats = result['statistics']
+    assert stats['count'] == 5  # the 10000 outlier is gone
+    assert (stats['q1'], stats['median'], stats['q3'], stats['iqr']) == (200, 300, 400, 200)
+    assert result['recommendation'] == expected
+
+def test_missing_database(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        AuctionAnalyzer(tmp_path / "missing.db")
 
 if __name__ == '__main__':
-    main()
+    sys.exit(pytest.main([__file__, "-v"]))